@@ -1,10 +1,11 @@
 import logging
 import os
+import pickle
 import random
-import json
 import sys
 from collections import deque
-from typing import Deque
+from functools import partial
+from typing import Callable, Deque
 
 # setup logger
 logging.basicConfig(level=logging.DEBUG,
@@ -21,15 +22,17 @@ INITIAL_PLAIN = [
     ['X', ' ', ' ', ' ', 'X', ' ', 'H', 'X'],
     [' ', ' ', 'X', ' ', ' ', ' ', 'X', 'X']
 ]
-SPAWN_POINT = [3, 0]
-# cell variables
-BLOCKED = 'X'
-FREE = ' '
-KEY = 'K'
-HEALTH = 'H'
-FINISH = 'F'
+SPAWN_POINT = (3, 0)
+# cell variables (byte values of map cells)
+BLOCKED = ord('X')
+FREE = ord(' ')
+KEY = ord('K')
+HEALTH = ord('H')
+FINISH = ord('F')
 # 'D' stands for Damage
-FIRE = 'D'
+FIRE = ord('D')
+# cells player is allowed to step back from
+HEAL_OR_KEY = (HEALTH, KEY)
 # amount of fire to be put on map
 FIRE_AMOUNT = 4
 # actions keys
@@ -44,27 +47,34 @@ HEAL = 'h'
 TAKE = 't'
 FIGHT = 'f'
 # direction is key, vector is value
-move: dict[str, list] = {
-    UP: [-1, 0],
-    DOWN: [1, 0],
-    LEFT: [0, -1],
-    RIGHT: [0, 1]
+move: dict[str, tuple] = {
+    UP: (-1, 0),
+    DOWN: (1, 0),
+    LEFT: (0, -1),
+    RIGHT: (0, 1)
 }
 
 
 class Player:
+    __slots__ = ('__name', '__health', '__has_key', '__cur', '__prev', '__hp', 'can_heal', 'is_alive')
+
     def __init__(self, name: str,
                  health: int = None,
                  has_key: bool = None,
-                 cur: list = None,
-                 prev: list = None,
+                 cur: tuple = None,
+                 prev: tuple = None,
                  hp: int = None):
         self.__name: str = name
         self.__health: int = health if health is not None else INITIAL_HEALTH
         self.__has_key: bool = has_key if has_key is not None else False
-        self.__cur: list = cur if cur is not None else SPAWN_POINT
-        self.__prev: list = prev
+        # positions are immutable tuples, so they are shared without copying
+        self.__cur: tuple = tuple(cur) if cur is not None else SPAWN_POINT
+        self.__prev: tuple = tuple(prev) if prev is not None else None
         self.__hp: int = hp if hp is not None else HEAL_POINTS
+        # status flags are plain fields, refreshed whenever health or HP change
+        self.can_heal: bool = False
+        self.is_alive: bool = True
+        self.__update_status()
 
     @property
     def name(self):
@@ -80,156 +90,145 @@ class Player:
 
     @property
     def cur(self):
-        return self.__cur.copy()
+        return self.__cur
 
     @property
     def prev(self):
-        if isinstance(self.__prev, list):
-            return self.__prev.copy()
-        return None
+        return self.__prev
 
     @property
     def hp(self):
         return self.__hp
 
-    @property
-    def can_heal(self):
-        return self.__hp > 0 and self.__health < INITIAL_HEALTH
-
-    @property
-    def is_alive(self):
-        return self.__health > 0
-
     def assign_key(self):
         self.__has_key = True
 
     def drop_key(self):
         self.__has_key = False
 
+    def __update_status(self):
+        self.can_heal = self.__hp > 0 and self.__health < INITIAL_HEALTH
+        self.is_alive = self.__health > 0
+
     def receive_damage(self):
         self.__health -= 1
+        self.__update_status()
 
     def restore_health(self):
         self.__health = INITIAL_HEALTH
+        self.__update_status()
 
     def heal(self):
         self.__health += 1
         self.__hp -= 1
+        self.__update_status()
 
-    def is_step_back(self, dydx: list):
-        py, px = self.cur
+    def is_step_back(self, dydx: tuple):
+        py, px = self.__cur
         dy, dx = dydx
-        return self.prev == [py + dy, px + dx]
+        return self.__prev == (py + dy, px + dx)
 
-    def move(self, dydx: list):
-        self.__prev = self.cur
-        py, px = self.cur
+    def move(self, dydx: tuple):
+        py, px = self.__prev = self.__cur
         dy, dx = dydx
-        self.__cur = [py + dy, px + dx]
+        self.__cur = (py + dy, px + dx)
 
 
 class GameMap:
-    def __init__(self, plain: list[list] = None):
-        self.__plain = plain if plain is not None else INITIAL_PLAIN
+    __slots__ = ('__rows', '__cols', '__buf', '__fire_cells', '__white_cells')
 
-    @property
-    def plain(self):
-        return self.__plain
-
-    # for fire and key
-    def __mark_cell(self, pos: list, cell: str):
-        self.__plain[pos[0]][pos[1]] = cell
-
-    # many for fire, once for key
-    def __clear_cell(self, cell: str, many: bool = False):
-        for row in range(len(self.__plain)):
-            for col in range(len(self.__plain[row])):
-                if self.__plain[row][col] == cell:
-                    self.__plain[row][col] = FREE
-                    if not many:
-                        return
-
-    def __white_cells(self):
-        cells = []
-        for row in range(len(self.__plain)):
-            for col in range(len(self.__plain[row])):
-                if self.__plain[row][col] == FREE:
-                    cells.append((row, col))
-        return cells
-
-    def spawn_fire(self):
-        fire_cells = random.sample(self.__white_cells(), FIRE_AMOUNT)
-        for cell in fire_cells:
-            self.__mark_cell(cell, FIRE)
-        logging.info(f'Fire spawned at cells {", ".join(map(str, fire_cells))}')
-
-    def clear_fire(self):
-        self.__clear_cell(cell=FIRE, many=True)
+    def __init__(self, plain: list[list] = None):
+        plain = plain if plain is not None else INITIAL_PLAIN
+        self.__rows: int = len(plain)
+        self.__cols: int = len(plain[0])
+        # map is stored as flat row-major buffer of cell bytes
+        self.__buf: bytearray = bytearray(''.join(''.join(row) for row in plain).encode())
+        # fire spawned on previous turn (loaded map may already contain it)
+        self.__fire_cells: list[tuple] = [divmod(i, self.__cols)
+                                          for i, cell in enumerate(self.__buf) if cell == FIRE]
+        # cells fire can be spawned on, only change when key is moved
+        self.__white_cells: tuple = self.__find_white_cells()
+
+    def __idx(self, pos: list) -> int:
+        return pos[0] * self.__cols + pos[1]
+
+    def __mark_cell(self, pos: list, cell: int):
+        self.__buf[self.__idx(pos)] = cell
+
+    def __clear_cell(self, cell: int):
+        i = self.__buf.find(cell)
+        if i >= 0:
+            self.__buf[i] = FREE
+
+    # fire cells are counted as white, they are cleared before next spawn
+    def __find_white_cells(self) -> tuple:
+        return tuple(divmod(i, self.__cols) for i, cell in enumerate(self.__buf) if cell in (FREE, FIRE))
+
+    # clears fire of previous turn and spawns new one without scanning map
+    def cycle_fire(self):
+        buf, cols = self.__buf, self.__cols
+        for y, x in self.__fire_cells:
+            # key could be dropped on fire cell, don't erase it
+            if buf[y * cols + x] == FIRE:
+                buf[y * cols + x] = FREE
+        # sample indices, so only chosen cells are materialized
+        white_cells = self.__white_cells
+        fire_cells = [white_cells[i] for i in random.sample(range(len(white_cells)), FIRE_AMOUNT)]
+        for y, x in fire_cells:
+            buf[y * cols + x] = FIRE
+        self.__fire_cells = fire_cells
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info('Fire spawned at cells %s', ', '.join(map(str, fire_cells)))
 
     def spawn_key(self, pos: list):
         self.__mark_cell(pos, KEY)
+        self.__white_cells = self.__find_white_cells()
 
     def clear_key(self):
         self.__clear_cell(KEY)
+        self.__white_cells = self.__find_white_cells()
 
-    def is_fire(self, pos: list) -> bool:
-        return self.__plain[pos[0]][pos[1]] == FIRE
-
-    def is_heal(self, pos: list) -> bool:
-        return self.__plain[pos[0]][pos[1]] == HEALTH
+    def cell(self, pos: list) -> int:
+        return self.__buf[self.__idx(pos)]
 
     def is_key(self, pos: list) -> bool:
-        return self.__plain[pos[0]][pos[1]] == KEY
+        return self.__buf[self.__idx(pos)] == KEY
 
     def is_heal_or_key(self, pos: list) -> bool:
-        return self.__plain[pos[0]][pos[1]] in [KEY, HEAL]
-
-    def is_finish(self, pos: list):
-        return self.__plain[pos[0]][pos[1]] == FINISH
+        return self.__buf[self.__idx(pos)] in HEAL_OR_KEY
 
-    def is_valid_move(self, dydx: list, p: Player):
+    def is_valid_move(self, dydx: tuple, p: Player):
         dy, dx = dydx
         py, px = p.cur
         pos_y, pos_x = py + dy, px + dx
-        is_inside_map = 0 <= pos_y < len(self.__plain) and 0 <= pos_x < len(self.plain[0])
+        is_inside_map = 0 <= pos_y < self.__rows and 0 <= pos_x < self.__cols
         if not is_inside_map:
             return False
-        return self.__plain[pos_y][pos_x] != BLOCKED
+        return self.__buf[pos_y * self.__cols + pos_x] != BLOCKED
 
 
 class SaveManager:
     @staticmethod
     def save_exists():
-        return os.path.exists('save.json')
+        return os.path.exists('save.pkl')
 
     @staticmethod
     def save(q: Deque[Player], gm: GameMap):
+        # players and map are pickled as is, no conversion to plain data needed
         data = {
-            'queue': [{
-                'name': p.name,
-                'health': p.health,
-                'has_key': p.has_key,
-                'cur': p.cur,
-                'prev': p.prev,
-                'hp': p.hp
-            } for p in q],
-            'map': gm.plain
+            'queue': q,
+            'map': gm
         }
-        try:
-            with open('save.json', 'w') as f:
-                json.dump(data, f, indent=4)
-        except IOError:
-            # If the file doesn't exist, create it and write the save
-            with open('save.json', 'w+') as f:
-                json.dump(data, f, indent=4)
+        with open('save.pkl', 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
 
     @staticmethod
     def load():
-        with open('save.json', 'r') as f:
-            data = json.load(f)
+        with open('save.pkl', 'rb') as f:
+            data = pickle.load(f)
         return {
-            'map': GameMap(plain=data['map']),
-            'queue': deque(Player(**p) for p in data['queue'])
+            'map': data['map'],
+            'queue': data['queue']
         }
 
 
@@ -237,118 +236,136 @@ class Game:
     def __init__(self):
         self.__queue = deque()
         self.__map = GameMap()
+        # ids of players still in game, including the one making a turn
+        self.__alive: set[int] = set()
+        # prompt is only shown when game is played from terminal
+        self.__interactive: bool = sys.stdin.isatty()
+        # action key is key, handler of player's turn is value
+        self.__handlers: dict[str, Callable[[Player], None]] = {
+            SAVE: self.__handle_save,
+            HEAL: self.__handle_heal,
+            TAKE: self.__handle_key,
+            FIGHT: self.__handle_fight,
+            **{key: partial(self.__handle_move, key) for key in move}
+        }
+        # cell is key, handler of player stepped on it is value
+        self.__cell_handlers: dict[int, Callable[[Player], None]] = {
+            FIRE: self.__on_fire,
+            KEY: self.__on_key,
+            HEALTH: self.__on_heal,
+            FINISH: self.__on_finish
+        }
 
     def __load(self):
         data = SaveManager.load()
         self.__queue = data['queue']
         self.__map = data['map']
+        self.__alive = {id(p) for p in self.__queue}
 
     def __handle_save(self, p: Player):
         # save is not counted as action, push player back
         # to the start of the queue and let him repeat action
         self.__queue.append(p)
         SaveManager.save(self.__queue, self.__map)
-        logging.info(f'{p.name} saved a game')
-        self.__action()
+        logging.info('%s saved a game', p.name)
 
     def __drop_key_and_kick_after_death(self, p: Player):
         if p.has_key:
             p.drop_key()
             self.__map.spawn_key(p.cur)
-        if p in self.__queue:
-            self.__queue.remove(p)
-        logging.info(f'{p.name} died: kicked from the game')
-
-    def __check_hit_wall(self, dydx: list, p: Player):
+        if id(p) in self.__alive:
+            self.__alive.discard(id(p))
+            try:
+                self.__queue.remove(p)
+            except ValueError:
+                # player making a turn is already popped from the queue
+                pass
+        logging.info('%s died: kicked from the game', p.name)
+
+    # checks return True if player's turn is over
+    def __check_hit_wall(self, dydx: tuple, p: Player) -> bool:
         if self.__map.is_valid_move(dydx=dydx, p=p):
-            return
+            return False
         p.receive_damage()
-        logging.info(f'{p.name} hit the wall: {p.health} health')
+        logging.info('%s hit the wall: %s health', p.name, p.health)
         if not p.is_alive:
             self.__drop_key_and_kick_after_death(p)
-            self.__action()
-        self.__queue.appendleft(p)
-        self.__action()
+        else:
+            self.__queue.appendleft(p)
+        return True
 
-    def __check_step_back(self, dydx: list, p: Player):
+    def __check_step_back(self, dydx: tuple, p: Player) -> bool:
         if p.is_step_back(dydx) and not self.__map.is_heal_or_key(p.cur):
-            logging.info(f'{p.name} stepped back: kicked from the game')
-            self.__action()
+            self.__alive.discard(id(p))
+            logging.info('%s stepped back: kicked from the game', p.name)
+            return True
+        return False
 
     def __check_other_players_on_cell(self, p: Player):
-        present_names = [other.name for other in self.__queue if other.cur == p.cur]
-        if len(present_names):
-            logging.info('Other players present on cell: {p}'.format(p=', '.join(present_names)))
-
-    def __check_step_on_fire(self, p: Player):
-        if self.__map.is_fire(p.cur):
-            p.receive_damage()
-            logging.info(f'{p.name} stepped on fire: {p.health} health')
-            if not p.is_alive:
-                self.__drop_key_and_kick_after_death(p)
-                self.__action()
-            self.__queue.appendleft(p)
-            self.__action()
+        # check is only informational, skip scanning queue if it won't be logged
+        if not logging.getLogger().isEnabledFor(logging.INFO):
+            return
+        cur = p.cur
+        present_names = [other.name for other in self.__queue if other.cur == cur]
+        if present_names:
+            logging.info('Other players present on cell: %s', ', '.join(present_names))
 
-    def __check_cell_has_key(self, p: Player):
-        if self.__map.is_key(p.cur):
-            logging.info(f'Cell {p.cur} has key')
+    # cell handlers put player back to the queue or kick him
+    def __on_fire(self, p: Player):
+        p.receive_damage()
+        logging.info('%s stepped on fire: %s health', p.name, p.health)
+        if not p.is_alive:
+            self.__drop_key_and_kick_after_death(p)
+        else:
             self.__queue.appendleft(p)
-            self.__action()
 
-    def __check_cell_is_heal(self, p: Player):
-        if self.__map.is_heal(p.cur):
-            p.restore_health()
-            logging.info(f'{p.name} restored health: {p.health} health')
-            self.__queue.appendleft(p)
-            self.__action()
+    def __on_key(self, p: Player):
+        logging.info('Cell %s has key', p.cur)
+        self.__queue.appendleft(p)
 
-    def __check_finish(self, p: Player):
-        if self.__map.is_finish(p.cur):
-            if p.has_key:
-                logging.info(f'{p.name} won')
-                sys.exit()
-            else:
-                logging.info(f'{p.name} came to the finish without key')
-                self.__drop_key_and_kick_after_death(p)
-                self.__action()
+    def __on_heal(self, p: Player):
+        p.restore_health()
+        logging.info('%s restored health: %s health', p.name, p.health)
+        self.__queue.appendleft(p)
+
+    def __on_finish(self, p: Player):
+        if p.has_key:
+            logging.info('%s won', p.name)
+            sys.exit()
+        logging.info('%s came to the finish without key', p.name)
+        self.__drop_key_and_kick_after_death(p)
 
     def __handle_move(self, key: str, p: Player):
         dydx = move[key]
-        self.__check_hit_wall(dydx=dydx, p=p)
-        self.__check_step_back(dydx=dydx, p=p)
+        if self.__check_hit_wall(dydx=dydx, p=p) or self.__check_step_back(dydx=dydx, p=p):
+            return
         p.move(dydx)
-        logging.info(f'{p.name} new position: {str(p.cur)}')
+        logging.info('%s new position: %s', p.name, p.cur)
         self.__check_other_players_on_cell(p)
-        self.__check_step_on_fire(p)
-        self.__check_cell_has_key(p)
-        self.__check_cell_is_heal(p)
-        self.__check_finish(p)
-        self.__queue.appendleft(p)
-        self.__action()
+        handler = self.__cell_handlers.get(self.__map.cell(p.cur))
+        if handler is not None:
+            handler(p)
+        else:
+            self.__queue.appendleft(p)
 
     def __handle_heal(self, p: Player):
         if p.can_heal:
             p.heal()
-            logging.info(f'{p.name} healed himself: {p.health} health')
+            logging.info('%s healed himself: %s health', p.name, p.health)
             self.__queue.appendleft(p)
-            self.__action()
         else:
-            logging.info(f'{p.name} should either have max health or have no HP')
+            logging.info('%s should either have max health or have no HP', p.name)
             self.__queue.append(p)
-            self.__action()
 
     def __handle_key(self, p: Player):
         if self.__map.is_key(p.cur):
             p.assign_key()
             self.__map.clear_key()
-            logging.info(f'{p.name} took key')
+            logging.info('%s took key', p.name)
             self.__queue.appendleft(p)
-            self.__action()
         else:
-            logging.info(f'There is no key in current position')
+            logging.info('There is no key in current position')
             self.__queue.append(p)
-            self.__action()
 
     def __handle_fight(self, p: Player):
         # can't delete elements in queue while iterate through it,
@@ -357,40 +374,40 @@ class Game:
         for player in self.__queue:
             if player.cur == p.cur:
                 player.receive_damage()
-                logging.info(f'{player.name} received damage from {p.name}: {player.health} health left')
+                logging.info('%s received damage from %s: %s health left', player.name, p.name, player.health)
                 if not player.is_alive:
                     killed.append(player)
         for k in killed:
             self.__drop_key_and_kick_after_death(k)
         self.__queue.appendleft(p)
-        self.__action()
+
+    def __read_key(self, p: Player) -> str:
+        if self.__interactive:
+            sys.stdout.write(f'\n{p.name} turn: ')
+            sys.stdout.flush()
+        line = sys.stdin.readline()
+        # keep input() behaviour on closed stdin instead of looping on empty key
+        if not line:
+            raise EOFError
+        return line.rstrip('\n')
 
     def __action(self):
-        # if no players left
-        if len(self.__queue) == 0:
-            logging.info('No players left: game is over')
-            sys.exit()
-        # clear previously generated fire cells
-        self.__map.clear_fire()
-        # before each action spawn fire
-        self.__map.spawn_fire()
-        # pop player from queue
-        player = self.__queue.pop()
-        key = input(f'\n{player.name} turn: ')
-        if key == SAVE:
-            self.__handle_save(player)
-        elif key in [UP, DOWN, LEFT, RIGHT]:
-            self.__handle_move(key=key, p=player)
-        elif key == HEAL:
-            self.__handle_heal(player)
-        elif key == TAKE:
-            self.__handle_key(player)
-        elif key == FIGHT:
-            self.__handle_fight(player)
-        else:
-            logging.info('Invalid key: try again')
-            self.__queue.append(player)
-            self.__action()
+        # each handler puts player back to the queue (or kicks him),
+        # loop goes on until no players left
+        while self.__queue:
+            # before each action move fire to new cells
+            self.__map.cycle_fire()
+            # pop player from queue
+            player = self.__queue.pop()
+            key = self.__read_key(player)
+            handler = self.__handlers.get(key)
+            if handler is not None:
+                handler(player)
+            else:
+                logging.info('Invalid key: try again')
+                self.__queue.append(player)
+        logging.info('No players left: game is over')
+        sys.exit()
 
     def __start(self):
         num = int(input('Enter amount of players: '))
@@ -398,6 +415,7 @@ class Game:
             name = input(f'Enter {n + 1} players\'s name: ')
             player = Player(name=name)
             self.__queue.appendleft(player)
+            self.__alive.add(id(player))
         self.__action()
 
     def run(self):